@@ -0,0 +1,28 @@
+# List of 25 Major Indian Cities with approximate coordinates
+CITIES = {
+    "Delhi": (28.6139, 77.2090),
+    "Mumbai": (19.0760, 72.8777),
+    "Bengaluru": (12.9716, 77.5946),
+    "Kolkata": (22.5726, 88.3639),
+    "Chennai": (13.0827, 80.2707),
+    "Hyderabad": (17.3850, 78.4867),
+    "Pune": (18.5204, 73.8567),
+    "Ahmedabad": (23.0225, 72.5714),
+    "Jaipur": (26.9124, 75.7873),
+    "Lucknow": (26.8467, 80.9462),
+    "Patna": (25.5941, 85.1376),
+    "Nagpur": (21.1458, 79.0882),
+    "Indore": (22.7196, 75.8577),
+    "Thane": (19.2183, 72.9781),
+    "Bhopal": (23.2599, 77.4126),
+    "Visakhapatnam": (17.6868, 83.2185),
+    "Surat": (21.1702, 72.8311),
+    "Kanpur": (26.4499, 80.3319),
+    "Ghaziabad": (28.6692, 77.4538),
+    "Ludhiana": (30.9010, 75.8573),
+    "Agra": (27.1767, 78.0081),
+    "Nashik": (19.9975, 73.7898),
+    "Vadodara": (22.3072, 73.1812),
+    "Faridabad": (28.4089, 77.3178),
+    "Meerut": (28.9845, 77.7064)
+}
@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BASE_DIR)
+
+import series_store
+
+# Forecast results keyed on (city, data version). The version is the city's
+# in-process invalidation generation plus the series store's persisted version,
+# which every change bumps, so ingestion or replay run from another process is
+# picked up on the next request. Concurrent misses on the same key share a single
+# computation (single-flight).
+MAX_ENTRIES = 64
+TTL_SECONDS = 30 * 60  # Matches the auto-ingestion interval in main.py
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # (city, version) -> (expires_at, forecasts)
+_inflight = {}            # (city, version) -> Future
+_generations = {}         # city -> int, bumped by invalidate()
+
+def data_version(city):
+    with _lock:
+        generation = _generations.get(city, 0)
+    return generation, series_store.current_version(city)
+
+def get_forecast(city, compute):
+    """Return compute(city), served from cache when the city's data hasn't changed."""
+    key = (city, data_version(city))
+    with _lock:
+        entry = _entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            _entries.move_to_end(key)
+            return entry[1]
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not leader:
+        return future.result()
+
+    try:
+        forecasts = compute(city)
+    except Exception as e:
+        with _lock:
+            _inflight.pop(key, None)
+        future.set_exception(e)
+        raise
+
+    with _lock:
+        _inflight.pop(key, None)
+        # Don't store a result that was invalidated while it was being computed
+        if _generations.get(city, 0) == key[1][0]:
+            # Older versions of this city can never be hit again; free their slots
+            for old_key in [k for k in _entries if k[0] == city and k != key]:
+                del _entries[old_key]
+            _entries[key] = (time.monotonic() + TTL_SECONDS, forecasts)
+            _entries.move_to_end(key)
+            while len(_entries) > MAX_ENTRIES:
+                _entries.popitem(last=False)
+    future.set_result(forecasts)
+    return forecasts
+
+def invalidate(city):
+    """Drop cached forecasts for a city; called after ingestion commits new rows."""
+    with _lock:
+        _generations[city] = _generations.get(city, 0) + 1
+        for key in [k for k in _entries if k[0] == city]:
+            del _entries[key]
@@ -1,4 +1,5 @@
 from fastapi import FastAPI, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -8,8 +9,11 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database import get_db
+import series_store
 from models_db import AQICleaned, AQIForecast
 import ml_inference
+import spatial
+import forecast_cache
 
 import asyncio
 from backend.scripts.ingest_data import ingest_data
@@ -31,8 +35,18 @@ async def periodic_ingest():
         # Wait for 30 minutes (30 * 60 seconds)
         await asyncio.sleep(30 * 60)
 
+# Existing installs have aqi_cleaned rows but no series yet; build them once so
+# LSTM inference doesn't depend on the first successful fetch.
+async def backfill_series():
+    try:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, lambda: series_store.rebuild_all(missing_only=True))
+    except Exception as e:
+        print(f"❌ Series Backfill Failed: {e}")
+
 @app.on_event("startup")
 async def startup_event():
+    asyncio.create_task(backfill_series())
     asyncio.create_task(periodic_ingest())
 
 @app.get("/cities")
@@ -95,5 +109,67 @@ def get_history(city: str = Query(..., description="City name"), period: str = "
 @app.get("/forecast")
 def get_forecast(city: str = Query(..., description="City name")):
     """Get 72h forecast for a specific city."""
-    forecasts = ml_inference.get_combined_forecast(city)
+    forecasts = forecast_cache.get_forecast(city, ml_inference.get_combined_forecast)
     return forecasts
+
+
+MAX_BATCH_POINTS = 250000
+MAX_FORECAST_POINTS = 1000  # Each point carries 2 x 72 forecast values
+
+class PointsQuery(BaseModel):
+    lats: List[float]
+    lons: List[float]
+    k: int = Field(4, ge=1, le=len(spatial.STATION_NAMES))
+    max_distance_km: Optional[float] = None
+    include_forecast: bool = False
+
+@app.get("/point")
+def get_point(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(4, ge=1, le=len(spatial.STATION_NAMES)),
+    max_distance_km: Optional[float] = Query(None, gt=0),
+    include_forecast: bool = True,
+    db: Session = Depends(get_db)
+):
+    """Nearest-station readings and an IDW estimate (current + 72h forecast) for any coordinate."""
+    result = spatial.estimate_point(db, lat, lon, k=k, max_distance_km=max_distance_km, include_forecast=include_forecast)
+    if not result["neighbours"]:
+        raise HTTPException(status_code=404, detail="No station within range of this point")
+    return result
+
+@app.post("/points")
+def post_points(query: PointsQuery, db: Session = Depends(get_db)):
+    """Batch IDW estimates for many coordinates in one vectorized pass."""
+    if len(query.lats) != len(query.lons):
+        raise HTTPException(status_code=400, detail="lats and lons must have the same length")
+    max_points = MAX_FORECAST_POINTS if query.include_forecast else MAX_BATCH_POINTS
+    if len(query.lats) > max_points:
+        raise HTTPException(status_code=400, detail=f"At most {max_points} points per request")
+    # Comparisons are False for NaN, so this also rejects non-finite coordinates
+    if not all(-90 <= lat <= 90 for lat in query.lats) or not all(-180 <= lon <= 180 for lon in query.lons):
+        raise HTTPException(status_code=400, detail="lats must be within [-90, 90] and lons within [-180, 180]")
+    if query.max_distance_km is not None and not query.max_distance_km > 0:
+        raise HTTPException(status_code=400, detail="max_distance_km must be positive")
+    return spatial.estimate_points(db, query.lats, query.lons, k=query.k,
+                                   max_distance_km=query.max_distance_km,
+                                   include_forecast=query.include_forecast)
+
+@app.get("/grid")
+def get_grid(
+    lat_min: float = Query(..., ge=-90, le=90),
+    lat_max: float = Query(..., ge=-90, le=90),
+    lon_min: float = Query(..., ge=-180, le=180),
+    lon_max: float = Query(..., ge=-180, le=180),
+    step: float = Query(0.1, gt=0),
+    k: int = Query(4, ge=1, le=len(spatial.STATION_NAMES)),
+    max_distance_km: Optional[float] = Query(None, gt=0),
+    db: Session = Depends(get_db)
+):
+    """Raster heatmap of IDW-estimated PM2.5/AQI over a lat/lon bounding box."""
+    if lat_min > lat_max or lon_min > lon_max:
+        raise HTTPException(status_code=400, detail="Empty bounding box")
+    n_points = spatial.grid_size(lat_min, lat_max, lon_min, lon_max, step)
+    if n_points > MAX_BATCH_POINTS:
+        raise HTTPException(status_code=400, detail=f"Grid too large ({n_points} points); increase step")
+    return spatial.estimate_grid(db, lat_min, lat_max, lon_min, lon_max, step, k=k, max_distance_km=max_distance_km)
@@ -12,6 +12,7 @@ sys.path.append(BASE_DIR)
 
 from database import SessionLocal
 from models_db import AQICleaned
+import series_store
 
 def calculate_aqi_only(pm25):
     if pm25 is None: return 0
@@ -84,17 +85,17 @@ def load_lstm_forecast(city, hours=72):
         with open(scaler_path, 'rb') as f:
             scaler = pickle.load(f)
             
-        session = SessionLocal()
-        records = session.query(AQICleaned).filter_by(city=city).order_by(AQICleaned.timestamp.desc()).limit(24).all()
-        session.close()
-        
-        if len(records) < 24: return []
+        # The series is built by ingestion; never rebuild it on the request path
+        window = series_store.get_window(city, 24)
+        if window is None: return []
             
-        data = np.array([r.pm25 for r in reversed(records)]).reshape(-1, 1)
+        current_time, values, _ = window
+        # Copy out of the mapping so it isn't held open across the 72-step rollout
+        data = np.array(values, dtype=np.float64).reshape(-1, 1)
+        del window, values
         current_input = scaler.transform(data).reshape(1, 24, 1)
         
         forecasts = []
-        current_time = records[0].timestamp
         
         for i in range(hours):
             pred_scaled = model.predict(current_input, verbose=0)
@@ -1,46 +1,27 @@
 import requests
 import pandas as pd
 from datetime import datetime, timedelta
+import gzip
+import json
 import sys
 import os
 import time
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
 
 from database import SessionLocal
 from models_db import AQIRaw, AQICleaned
-
-# List of 25 Major Indian Cities with approximate coordinates
-CITIES = {
-    "Delhi": (28.6139, 77.2090),
-    "Mumbai": (19.0760, 72.8777),
-    "Bengaluru": (12.9716, 77.5946),
-    "Kolkata": (22.5726, 88.3639),
-    "Chennai": (13.0827, 80.2707),
-    "Hyderabad": (17.3850, 78.4867),
-    "Pune": (18.5204, 73.8567),
-    "Ahmedabad": (23.0225, 72.5714),
-    "Jaipur": (26.9124, 75.7873),
-    "Lucknow": (26.8467, 80.9462),
-    "Patna": (25.5941, 85.1376),
-    "Nagpur": (21.1458, 79.0882),
-    "Indore": (22.7196, 75.8577),
-    "Thane": (19.2183, 72.9781),
-    "Bhopal": (23.2599, 77.4126),
-    "Visakhapatnam": (17.6868, 83.2185),
-    "Surat": (21.1702, 72.8311),
-    "Kanpur": (26.4499, 80.3319),
-    "Ghaziabad": (28.6692, 77.4538),
-    "Ludhiana": (30.9010, 75.8573),
-    "Agra": (27.1767, 78.0081),
-    "Nashik": (19.9975, 73.7898),
-    "Vadodara": (22.3072, 73.1812),
-    "Faridabad": (28.4089, 77.3178),
-    "Meerut": (28.9845, 77.7064)
-}
+import series_store
+import forecast_cache
+from cities import CITIES  # Re-exported; spatial.py reads it without loading this script
 
 API_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
 
+# Raw payloads are archived as data/raw/<city>/<YYYY-MM-DD>.json.gz so aqi_cleaned
+# can be rebuilt offline (see replay_archive.py).
+ARCHIVE_DIR = os.path.join(BASE_DIR, "data", "raw")
+
 def fetch_data(lat, lon):
     """Fetch last 90 days of PM2.5 data from OpenMeteo."""
     end_date = datetime.now().date()
@@ -83,6 +64,79 @@ def get_aqi_category(aqi):
     if aqi <= 400: return "Very Poor"
     return "Severe"
 
+def _read_archived_day(path):
+    if not os.path.exists(path): return None
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+def archive_payload(city, data):
+    """
+    Split a raw Open-Meteo response into one gzipped JSON file per city/day.
+    Same conflict rule as ingest_data: the newest non-null value for an hour wins,
+    and a null never erases an earlier reading. Days whose content is unchanged
+    are not rewritten.
+    """
+    hourly = data.get("hourly", {})
+    timestamps = hourly.get("time", [])
+    pm25_values = hourly.get("pm2_5", [])
+
+    days = {}
+    for ts_str, pm25 in zip(timestamps, pm25_values):
+        day = days.setdefault(ts_str[:10], {"time": [], "pm2_5": []})
+        day["time"].append(ts_str)
+        day["pm2_5"].append(pm25)
+
+    city_dir = os.path.join(ARCHIVE_DIR, city)
+    os.makedirs(city_dir, exist_ok=True)
+    for day, columns in days.items():
+        path = os.path.join(city_dir, f"{day}.json.gz")
+        existing = _read_archived_day(path)
+        if existing is not None:
+            old_hourly = existing.get("hourly", {})
+            merged = dict(zip(old_hourly.get("time", []), old_hourly.get("pm2_5", [])))
+            for ts_str, pm25 in zip(columns["time"], columns["pm2_5"]):
+                if pm25 is not None or ts_str not in merged:
+                    merged[ts_str] = pm25
+            times = sorted(merged)
+            columns = {"time": times, "pm2_5": [merged[t] for t in times]}
+            if columns == {"time": old_hourly.get("time"), "pm2_5": old_hourly.get("pm2_5")}:
+                continue
+
+        payload = {
+            "latitude": data.get("latitude"),
+            "longitude": data.get("longitude"),
+            "timezone": data.get("timezone"),
+            "hourly_units": data.get("hourly_units", {}),
+            "hourly": columns
+        }
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+def parse_payload(city, data):
+    """Turn a raw Open-Meteo response into AQICleaned column dicts."""
+    hourly = data.get("hourly", {})
+    timestamps = hourly.get("time", [])
+    pm25_values = hourly.get("pm2_5", [])
+
+    records = []
+    for ts_str, pm25 in zip(timestamps, pm25_values):
+        if pm25 is None: continue
+
+        timestamp = datetime.strptime(ts_str, "%Y-%m-%dT%H:%M")
+        aqi = calculate_aqi(pm25)
+        records.append({
+            "city": city,
+            "timestamp": timestamp,
+            "pm25": pm25,
+            "aqi": aqi,
+            "category": get_aqi_category(aqi),
+            "hour": timestamp.hour,
+            "day_of_week": timestamp.weekday()
+        })
+    return records
+
 def ingest_data():
     session = SessionLocal()
     
@@ -94,40 +148,45 @@ def ingest_data():
             print(f"Skipping {city} due to fetch error.")
             continue
             
-        hourly = data.get("hourly", {})
-        timestamps = hourly.get("time", [])
-        pm25_values = hourly.get("pm2_5", [])
-        
-        count = 0
-        for i in range(len(timestamps)):
-            ts_str = timestamps[i]
-            pm25 = pm25_values[i]
-            if pm25 is None: continue
-                
-            timestamp = datetime.strptime(ts_str, "%Y-%m-%dT%H:%M")
-            
-            # Check existing to avoid duplication (slower but safer)
-            existing = session.query(AQICleaned).filter_by(city=city, timestamp=timestamp).first()
-            if existing: continue
+        archive_payload(city, data)
 
-            aqi = calculate_aqi(pm25)
-            category = get_aqi_category(aqi)
-            
-            cleaned_record = AQICleaned(
-                city=city,
-                timestamp=timestamp,
-                pm25=pm25,
-                aqi=aqi,
-                category=category,
-                hour=timestamp.hour,
-                day_of_week=timestamp.weekday()
-            )
-            session.add(cleaned_record)
-            count += 1
+        records = parse_payload(city, data)
+        existing = {}
+        if records:
+            rows = session.query(AQICleaned).filter(
+                AQICleaned.city == city,
+                AQICleaned.timestamp >= min(r["timestamp"] for r in records),
+                AQICleaned.timestamp <= max(r["timestamp"] for r in records)
+            ).all()
+            existing = {r.timestamp: r for r in rows}
+
+        # Upsert: the latest fetched value for an hour wins, matching archive_payload
+        count = 0
+        updated = 0
+        changed = []
+        for record in records:
+            row = existing.get(record["timestamp"])
+            if row is None:
+                session.add(AQICleaned(**record))
+                count += 1
+            elif row.pm25 != record["pm25"]:
+                row.pm25 = record["pm25"]
+                row.aqi = record["aqi"]
+                row.category = record["category"]
+                updated += 1
+            else:
+                continue
+            changed.append(record)
             
-        if count > 0:
-            print(f" -> Added {count} records for {city}.")
+        if count > 0 or updated > 0:
+            print(f" -> Added {count}, updated {updated} records for {city}.")
         session.commit() # Commit per city to save progress
+        # Mirror only the committed rows so the series matches aqi_cleaned
+        if not series_store.has_series(city):
+            series_changed = series_store.rebuild_city(city)
+        else:
+            series_changed = series_store.update_city(city, [r["timestamp"] for r in changed], [r["pm25"] for r in changed])
+        if changed or series_changed: forecast_cache.invalidate(city)
         if count > 0: time.sleep(1) # Be nice to API only if we hit it hard
 
     session.close()
@@ -0,0 +1,78 @@
+import gzip
+import json
+import sys
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal
+from models_db import AQICleaned
+from ingest_data import ARCHIVE_DIR, parse_payload
+import series_store
+
+def archived_cities():
+    if not os.path.exists(ARCHIVE_DIR): return []
+    return sorted(d for d in os.listdir(ARCHIVE_DIR) if os.path.isdir(os.path.join(ARCHIVE_DIR, d)))
+
+def load_city_archive(city):
+    """Read every archived day for a city and parse it into AQICleaned column dicts. Runs in a worker process."""
+    city_dir = os.path.join(ARCHIVE_DIR, city)
+    readings = {}
+    for name in sorted(os.listdir(city_dir)):
+        if not name.endswith(".json.gz"): continue
+        with gzip.open(os.path.join(city_dir, name), "rt", encoding="utf-8") as f:
+            hourly = json.load(f).get("hourly", {})
+        readings.update(zip(hourly.get("time", []), hourly.get("pm2_5", [])))
+
+    times = sorted(readings)
+    return city, parse_payload(city, {"hourly": {"time": times, "pm2_5": [readings[t] for t in times]}})
+
+def replay_archive(cities=None, workers=None):
+    """Rebuild aqi_cleaned for the given cities (default: all archived) without touching the network."""
+    start = time.time()
+    available = archived_cities()
+    if cities:
+        unknown = [c for c in cities if c not in available]
+        if unknown:
+            print(f"No archive for: {', '.join(unknown)}. Skipping.")
+        cities = [c for c in cities if c in available]
+    else:
+        cities = available
+    if not cities:
+        print(f"No archived payloads found in {ARCHIVE_DIR}.")
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(load_city_archive, cities))
+
+    session = SessionLocal()
+    try:
+        for city, records in results:
+            if not records: continue
+            # Only replace the archived span; older history predates the archive or the fetch window
+            session.query(AQICleaned).filter(
+                AQICleaned.city == city,
+                AQICleaned.timestamp >= min(r["timestamp"] for r in records),
+                AQICleaned.timestamp <= max(r["timestamp"] for r in records)
+            ).delete(synchronize_session=False)
+            session.bulk_insert_mappings(AQICleaned, records)
+            print(f" -> Rebuilt {len(records)} records for {city}.")
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    # Bumps each city's series version, which is how a running API learns its
+    # cached forecasts are stale; no restart needed.
+    for city, _ in results:
+        series_store.rebuild_city(city)
+
+    print(f"Replay Complete in {time.time() - start:.1f}s.")
+
+if __name__ == "__main__":
+    # Usage: python replay_archive.py [City ...]
+    replay_archive(sys.argv[1:] or None)
@@ -4,7 +4,6 @@ import pickle
 import os
 import sys
 from datetime import timedelta
-from sqlalchemy.orm import Session
 from sklearn.metrics import mean_squared_error, mean_absolute_error, mean_absolute_percentage_error
 from statsmodels.tsa.arima.model import ARIMA
 from tensorflow.keras.models import Sequential
@@ -21,20 +20,19 @@ if not os.path.exists(MODELS_DIR):
 
 from database import SessionLocal
 from models_db import AQICleaned
+import series_store
 
 def load_data(city=None):
-    session = SessionLocal()
-    query = session.query(AQICleaned.timestamp, AQICleaned.pm25).filter_by(city=city).order_by(AQICleaned.timestamp.asc())
-    df = pd.read_sql(query.statement, session.bind)
-    session.close()
-    
-    if df.empty: return df
-    
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df.set_index('timestamp', inplace=True)
-    df = df.asfreq('H')
-    df['pm25'] = df['pm25'].interpolate(method='linear')
-    return df
+    """Hourly, gap-filled PM2.5 for a city, backed by the memory-mapped series store."""
+    series = series_store.load_series(city)
+    if series is None:
+        series_store.rebuild_city(city)
+        series = series_store.load_series(city)
+    if series is None: return pd.DataFrame(columns=['pm25'])
+
+    start, values, _ = series
+    index = pd.date_range(start, periods=len(values), freq='H', name='timestamp')
+    return pd.DataFrame({'pm25': pd.Series(values, index=index, copy=False)})
 
 def save_model(model, filename):
     path = os.path.join(MODELS_DIR, filename)
@@ -0,0 +1,193 @@
+import json
+import os
+import sys
+import threading
+import numpy as np
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BASE_DIR)
+
+from database import SessionLocal
+from models_db import AQICleaned
+
+# Dense hourly PM2.5 per city: data/series/<city>.<version>.values.npy (float32,
+# gaps linearly interpolated), <city>.<version>.mask.npy (True where an actual
+# reading exists) and <city>.json pointing at the current version plus the
+# timestamp of index 0. Stride is fixed at one hour.
+#
+# Data files are never overwritten in place: each update writes a new version and
+# swaps the pointer in <city>.json. On Windows a file cannot be replaced or
+# deleted while it is memory-mapped, so superseded versions that are still mapped
+# are left behind and removed by a later update.
+SERIES_DIR = os.path.join(BASE_DIR, "data", "series")
+STRIDE = timedelta(hours=1)
+
+_lock = threading.Lock()
+
+def _meta_path(city):
+    return os.path.join(SERIES_DIR, f"{city}.json")
+
+def _data_paths(city, version):
+    prefix = os.path.join(SERIES_DIR, f"{city}.{version}")
+    return f"{prefix}.values.npy", f"{prefix}.mask.npy"
+
+def _read_meta(city):
+    path = _meta_path(city)
+    if not os.path.exists(path): return None
+    with open(path) as f:
+        return json.load(f)
+
+def _write_npy(path, arr):
+    with open(path, "wb") as f:
+        np.save(f, arr)
+
+def _remove_stale_versions(city, keep_version=None):
+    keep = set(_data_paths(city, keep_version)) if keep_version is not None else set()
+    for name in os.listdir(SERIES_DIR):
+        path = os.path.join(SERIES_DIR, name)
+        if not name.startswith(f"{city}.") or not name.endswith(".npy") or path in keep: continue
+        if name[len(city) + 1:].split(".")[0].isdigit():
+            try:
+                os.remove(path)
+            except PermissionError:
+                pass  # Still mapped by a reader (Windows); retried on the next update
+
+def _fill_gaps(raw, valid):
+    idx = np.arange(len(raw))
+    filled = raw.copy()
+    filled[~valid] = np.interp(idx[~valid], idx[valid], raw[valid])
+    return filled
+
+def load_series(city):
+    """
+    Memory-map a city's series. Returns (start, values, mask) or None if the city
+    has no series yet. values/mask are read-only np.memmap arrays; slice them
+    rather than copying, but copy anything held across long-running work so the
+    mapping can be released.
+    """
+    with _lock:
+        meta = _read_meta(city)
+        if meta is None: return None
+        values_path, mask_path = _data_paths(city, meta["version"])
+        values = np.load(values_path, mmap_mode="r")
+        mask = np.load(mask_path, mmap_mode="r")
+    return datetime.fromisoformat(meta["start"]), values, mask
+
+def has_series(city):
+    return os.path.exists(_meta_path(city))
+
+def last_timestamp(city):
+    """Newest hour in a city's series, read from the metadata alone (no mapping)."""
+    with _lock:
+        meta = _read_meta(city)
+    if meta is None: return None
+    return datetime.fromisoformat(meta["start"]) + (meta["length"] - 1) * STRIDE
+
+def current_version(city):
+    """Persisted series version, bumped on every real change; read from the metadata alone."""
+    with _lock:
+        meta = _read_meta(city)
+    return None if meta is None else meta["version"]
+
+def get_window(city, length=24):
+    """Last `length` hours ending at the newest reading: (end_timestamp, values, mask), or None."""
+    series = load_series(city)
+    if series is None: return None
+    start, values, mask = series
+    if len(values) < length: return None
+    return start + (len(values) - 1) * STRIDE, values[-length:], mask[-length:]
+
+def _to_arrays(timestamps, pm25_values):
+    ts = np.array(timestamps, dtype="datetime64[h]")
+    vals = np.array([np.nan if v is None else v for v in pm25_values], dtype=np.float32)
+    keep = ~np.isnan(vals)
+    return ts[keep], vals[keep]
+
+def _update_city_locked(city, ts, vals, replace=False):
+    """Merge (or with replace=True, substitute) readings; caller holds _lock. Returns True if the series changed."""
+    meta = None if replace else _read_meta(city)
+    if not len(ts):
+        if replace and has_series(city):
+            os.remove(_meta_path(city))
+            _remove_stale_versions(city)
+            return True
+        return False
+
+    start, end = ts.min(), ts.max()
+    old = None
+    if meta is not None:
+        old_start = np.datetime64(meta["start"], "h")
+        values_path, mask_path = _data_paths(city, meta["version"])
+        old = (old_start, np.load(values_path), np.load(mask_path))
+        start = min(start, old_start)
+        end = max(end, old_start + meta["length"] - 1)
+
+    length = int((end - start).astype(np.int64)) + 1
+    raw = np.full(length, np.nan, dtype=np.float32)
+    valid = np.zeros(length, dtype=bool)
+    if old is not None:
+        old_start, old_values, old_mask = old
+        offset = int((old_start - start).astype(np.int64))
+        raw[offset:offset + len(old_values)] = np.where(old_mask, old_values, np.nan)
+        valid[offset:offset + len(old_mask)] = old_mask
+
+    # Later readings for an hour win, as in ingest_data's upsert
+    pos = (ts - start).astype(np.int64)
+    raw[pos] = vals
+    valid[pos] = True
+    filled = _fill_gaps(raw, valid)
+
+    if old is not None and len(filled) == len(old[1]) and offset == 0 \
+            and np.array_equal(valid, old[2]) and np.array_equal(filled, old[1]):
+        return False
+
+    current = _read_meta(city)
+    version = (current["version"] + 1) if current else 1
+    values_path, mask_path = _data_paths(city, version)
+    _write_npy(values_path, filled)
+    _write_npy(mask_path, valid)
+    tmp_path = _meta_path(city) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"start": start.astype(datetime).isoformat(), "length": length,
+                   "version": version, "stride_hours": 1}, f)
+    os.replace(tmp_path, _meta_path(city))
+    _remove_stale_versions(city, keep_version=version)
+    return True
+
+def update_city(city, timestamps, pm25_values):
+    """Merge new hourly readings into a city's series. Returns True if the series changed."""
+    ts, vals = _to_arrays(timestamps, pm25_values)
+    if not len(ts): return False
+    os.makedirs(SERIES_DIR, exist_ok=True)
+    with _lock:
+        return _update_city_locked(city, ts, vals)
+
+def rebuild_city(city):
+    """
+    Rebuild a city's series from aqi_cleaned. Reads and rewrites under the lock so
+    concurrent readers and ingest updates never see a partial series. Always
+    writes a new version, even if PM2.5 is unchanged, so forecast caches keyed on
+    it (including a running API's) drop results derived from the old rows. Meant
+    for scripts and ingestion, not request handlers.
+    """
+    os.makedirs(SERIES_DIR, exist_ok=True)
+    with _lock:
+        session = SessionLocal()
+        rows = session.query(AQICleaned.timestamp, AQICleaned.pm25).filter_by(city=city).all()
+        session.close()
+        ts, vals = _to_arrays([r[0] for r in rows], [r[1] for r in rows])
+        return _update_city_locked(city, ts, vals, replace=True)
+
+def rebuild_all(missing_only=False):
+    """Rebuild every city in aqi_cleaned; with missing_only, just those that have no series yet."""
+    session = SessionLocal()
+    cities = [r[0] for r in session.query(AQICleaned.city).distinct().all()]
+    session.close()
+    for city in cities:
+        if missing_only and has_series(city): continue
+        rebuild_city(city)
+        print(f" -> Rebuilt series for {city}.")
+
+if __name__ == "__main__":
+    rebuild_all()
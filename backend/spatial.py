@@ -0,0 +1,260 @@
+import numpy as np
+import os
+import sys
+from datetime import datetime
+from scipy.spatial import cKDTree
+from sqlalchemy import func
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BASE_DIR)
+
+from models_db import AQICleaned
+from cities import CITIES
+import ml_inference
+import forecast_cache
+
+EARTH_RADIUS_KM = 6371.0
+EXACT_MATCH_KM = 1e-3  # Closer than this counts as sitting on the station
+
+STATION_NAMES = list(CITIES.keys())
+STATION_COORDS = np.array([CITIES[c] for c in STATION_NAMES], dtype=np.float64)
+
+_tree = None
+
+def to_unit_xyz(lats, lons):
+    """Project lat/lon degrees onto the unit sphere so euclidean distance is monotonic in great-circle distance."""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+def get_station_tree():
+    global _tree
+    if _tree is None:
+        _tree = cKDTree(to_unit_xyz(STATION_COORDS[:, 0], STATION_COORDS[:, 1]))
+    return _tree
+
+def nearest_stations(lats, lons, k=4, max_distance_km=None):
+    """
+    Query the k nearest stations for every (lat, lon) pair in one call.
+    Returns (distances_km, indices), both shaped (n_points, k). Neighbours beyond
+    max_distance_km come back with distance inf and index len(STATION_NAMES).
+    """
+    k = max(1, min(k, len(STATION_NAMES)))
+    points = to_unit_xyz(lats, lons).reshape(-1, 3)
+    bound = np.inf
+    if max_distance_km is not None:
+        bound = 2 * np.sin(min(max_distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+    chord, idx = get_station_tree().query(points, k=k, distance_upper_bound=bound)
+    chord = np.asarray(chord, dtype=np.float64).reshape(len(points), k)
+    idx = np.asarray(idx).reshape(len(points), k)
+    dist_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+    dist_km[~np.isfinite(chord)] = np.inf
+    return dist_km, idx
+
+def idw_weights(dist_km, valid=None, power=2):
+    """
+    Normalised inverse-distance weights over the neighbours in `valid`
+    (shape (n_points, k) or (n_points, k, horizon)); rows without any valid
+    neighbour are all zero. A point sitting on a station with data takes that
+    station's value outright.
+    """
+    if valid is None:
+        valid = np.ones(dist_km.shape, dtype=bool)
+    if valid.ndim == 3:
+        dist_km = dist_km[:, :, None]
+    valid = valid & np.isfinite(dist_km)
+
+    exact = valid & (dist_km < EXACT_MATCH_KM)
+    with np.errstate(divide="ignore"):
+        inverse = 1.0 / np.power(np.maximum(dist_km, EXACT_MATCH_KM), power)
+    weights = np.where(exact.any(axis=1, keepdims=True), exact, np.where(valid, inverse, 0.0)).astype(np.float64)
+    total = weights.sum(axis=1, keepdims=True)
+    return np.divide(weights, total, out=np.zeros_like(weights), where=total > 0)
+
+def neighbour_values(values, idx):
+    """Gather station values per neighbour; out-of-range neighbours (index == n_stations) come back NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    padded = np.concatenate([values, np.full((1,) + values.shape[1:], np.nan)])
+    return padded[idx]  # (n_points, k[, horizon])
+
+def idw_estimate(values, dist_km, idx, power=2):
+    """
+    Interpolate station values onto query points.
+    values is (n_stations,) or (n_stations, horizon); stations with NaN values are
+    dropped from the weighting. Returns (n_points,) or (n_points, horizon).
+    """
+    neighbours = neighbour_values(values, idx)
+    valid = ~np.isnan(neighbours)
+    weights = idw_weights(dist_km, valid, power)
+    estimate = (np.where(valid, neighbours, 0.0) * weights).sum(axis=1)
+    return np.where(valid.any(axis=1), estimate, np.nan)
+
+# CPCB breakpoints as used by ingest_data.calculate_aqi: (pm_min, pm_max, aqi_min, aqi_max)
+AQI_BREAKPOINTS = np.array([(0, 30, 0, 50), (30, 60, 51, 100), (60, 90, 101, 200),
+                            (90, 120, 201, 300), (120, 250, 301, 400)], dtype=np.float64)
+AQI_CATEGORIES = np.array(["Good", "Satisfactory", "Moderate", "Poor", "Very Poor", "Severe"], dtype=object)
+
+def aqi_from_pm25(pm25):
+    """Vectorized ingest_data.calculate_aqi; NaN stays NaN."""
+    pm25 = np.asarray(pm25, dtype=np.float64)
+    pm_min, pm_max, aqi_min, aqi_max = AQI_BREAKPOINTS.T
+    # Upper bounds are inclusive, so the first segment with pm25 <= pm_max applies
+    seg = np.minimum(np.searchsorted(pm_max, pm25, side="left"), len(AQI_BREAKPOINTS) - 1)
+    aqi = np.floor(aqi_min[seg] + (pm25 - pm_min[seg]) / (pm_max[seg] - pm_min[seg]) * (aqi_max[seg] - aqi_min[seg]))
+    aqi = np.where(pm25 > 250, 401 + (pm25 - 250), aqi)
+    aqi = np.where(pm25 < 0, 500, aqi)
+    return np.where(np.isnan(pm25), np.nan, aqi)
+
+def aqi_category(aqi):
+    """Vectorized ingest_data.get_aqi_category; NaN maps to None."""
+    aqi = np.asarray(aqi, dtype=np.float64)
+    seg = np.searchsorted(np.array([50, 100, 200, 300, 400], dtype=np.float64), aqi, side="left")
+    return np.where(np.isnan(aqi), None, AQI_CATEGORIES[np.minimum(seg, len(AQI_CATEGORIES) - 1)])
+
+def grid_axes(lat_min, lat_max, lon_min, lon_max, step):
+    return np.arange(lat_min, lat_max + step / 2, step), np.arange(lon_min, lon_max + step / 2, step)
+
+def grid_size(lat_min, lat_max, lon_min, lon_max, step):
+    """Number of points grid_axes would produce, without allocating them (np.arange length is ceil(span / step))."""
+    n_lat = max(0, int(np.ceil((lat_max + step / 2 - lat_min) / step)))
+    n_lon = max(0, int(np.ceil((lon_max + step / 2 - lon_min) / step)))
+    return n_lat * n_lon
+
+def latest_readings(db):
+    """Latest reading (not in the future) per station, as arrays aligned with STATION_NAMES."""
+    current_time = datetime.now().replace(microsecond=0)
+    latest_ts = db.query(
+        AQICleaned.city, func.max(AQICleaned.timestamp).label("timestamp")
+    ).filter(AQICleaned.timestamp <= current_time).group_by(AQICleaned.city).subquery()
+    rows = db.query(AQICleaned).join(
+        latest_ts,
+        (AQICleaned.city == latest_ts.c.city) & (AQICleaned.timestamp == latest_ts.c.timestamp)
+    ).all()
+
+    by_city = {r.city: r for r in rows}
+    pm25 = np.full(len(STATION_NAMES), np.nan)
+    aqi = np.full(len(STATION_NAMES), np.nan)
+    timestamps = [None] * len(STATION_NAMES)
+    for i, city in enumerate(STATION_NAMES):
+        r = by_city.get(city)
+        if r is None or r.pm25 is None: continue
+        pm25[i] = r.pm25
+        aqi[i] = r.aqi
+        timestamps[i] = r.timestamp
+    return pm25, aqi, timestamps
+
+def forecast_matrix(station_indices, hours=72):
+    """
+    Stack PM2.5 forecasts for the given stations into a (n_stations, hours) array.
+    Stations not requested, or without a forecast, stay NaN. Also returns the
+    per-station forecast timestamps.
+    """
+    pm25 = np.full((len(STATION_NAMES), hours), np.nan)
+    timestamps = [None] * len(STATION_NAMES)
+    for i in np.unique(station_indices):
+        if i >= len(STATION_NAMES): continue
+        forecast = forecast_cache.get_forecast(STATION_NAMES[i], ml_inference.get_combined_forecast)[:hours]
+        if not forecast: continue
+        n = len(forecast)
+        pm25[i, :n] = [f["pm25"] for f in forecast]
+        timestamps[i] = [f["timestamp"] for f in forecast]
+    return pm25, timestamps
+
+def to_json_list(arr, decimals=2):
+    """NaN-safe conversion for JSON responses."""
+    arr = np.round(np.asarray(arr, dtype=np.float64), decimals)
+    return np.where(np.isfinite(arr), arr, None).tolist()
+
+def estimate_point(db, lat, lon, k=4, max_distance_km=None, include_forecast=True):
+    dist_km, idx = nearest_stations([lat], [lon], k=k, max_distance_km=max_distance_km)
+    pm25, aqi, timestamps = latest_readings(db)
+
+    est_pm25 = idw_estimate(pm25, dist_km, idx)[0]
+    est_aqi = float(aqi_from_pm25(est_pm25))
+    weights = idw_weights(dist_km, ~np.isnan(neighbour_values(pm25, idx)))[0]
+
+    neighbours = []
+    for d, i, w in zip(dist_km[0], idx[0], weights):
+        if i >= len(STATION_NAMES): continue
+        neighbours.append({
+            "city": STATION_NAMES[i],
+            "distance_km": round(float(d), 2),
+            "weight": round(float(w), 4),
+            "timestamp": timestamps[i],
+            "pm25": None if np.isnan(pm25[i]) else float(pm25[i]),
+            "aqi": None if np.isnan(aqi[i]) else int(aqi[i]),
+            "category": aqi_category(aqi[i]).item()
+        })
+
+    result = {
+        "lat": lat,
+        "lon": lon,
+        "nearest": neighbours[0] if neighbours else None,
+        "neighbours": neighbours,
+        "estimate": {
+            "pm25": None if np.isnan(est_pm25) else round(float(est_pm25), 2),
+            "aqi": None if np.isnan(est_aqi) else int(round(est_aqi)),
+            "category": aqi_category(est_aqi).item()
+        },
+        "forecast": []
+    }
+
+    if include_forecast and neighbours:
+        f_pm25, f_timestamps = forecast_matrix(idx)
+        series_pm25 = idw_estimate(f_pm25, dist_km, idx)[0]
+        series_aqi = aqi_from_pm25(series_pm25)
+        # Label steps with the timestamps of the closest station that has a forecast
+        labels = next((f_timestamps[i] for i in idx[0] if i < len(STATION_NAMES) and f_timestamps[i]), [])
+        for step, ts in enumerate(labels):
+            if np.isnan(series_pm25[step]): break
+            result["forecast"].append({
+                "timestamp": ts,
+                "pm25": round(float(series_pm25[step]), 2),
+                "aqi": int(round(series_aqi[step])),
+                "model": "IDW",
+                "lat": lat,
+                "lon": lon
+            })
+    return result
+
+def estimate_points(db, lats, lons, k=4, max_distance_km=None, include_forecast=False, hours=72):
+    """Batch variant of estimate_point: one KD-tree query and one weighted sum for all points."""
+    lats = np.asarray(lats, dtype=np.float64).ravel()
+    lons = np.asarray(lons, dtype=np.float64).ravel()
+    dist_km, idx = nearest_stations(lats, lons, k=k, max_distance_km=max_distance_km)
+    pm25, _, _ = latest_readings(db)
+
+    est_pm25 = idw_estimate(pm25, dist_km, idx)
+    est_aqi = aqi_from_pm25(est_pm25)
+    nearest = [STATION_NAMES[i] if i < len(STATION_NAMES) else None for i in idx[:, 0]]
+    result = {
+        "lat": lats.tolist(),
+        "lon": lons.tolist(),
+        "nearest": nearest,
+        "distance_km": to_json_list(dist_km[:, 0]),
+        "pm25": to_json_list(est_pm25),
+        "aqi": to_json_list(est_aqi, decimals=0),
+        "category": aqi_category(est_aqi).tolist()
+    }
+    if include_forecast:
+        f_pm25, _ = forecast_matrix(idx, hours=hours)
+        series_pm25 = idw_estimate(f_pm25, dist_km, idx)
+        result["forecast_pm25"] = to_json_list(series_pm25)
+        result["forecast_aqi"] = to_json_list(aqi_from_pm25(series_pm25), decimals=0)
+    return result
+
+def estimate_grid(db, lat_min, lat_max, lon_min, lon_max, step, k=4, max_distance_km=None):
+    """Raster heatmap: estimates on a regular lat/lon grid, shaped (n_lat, n_lon)."""
+    grid_lats, grid_lons = grid_axes(lat_min, lat_max, lon_min, lon_max, step)
+    mesh_lat, mesh_lon = np.meshgrid(grid_lats, grid_lons, indexing="ij")
+
+    dist_km, idx = nearest_stations(mesh_lat.ravel(), mesh_lon.ravel(), k=k, max_distance_km=max_distance_km)
+    pm25, _, _ = latest_readings(db)
+    est_pm25 = idw_estimate(pm25, dist_km, idx).reshape(mesh_lat.shape)
+    return {
+        "lat": np.round(grid_lats, 6).tolist(),
+        "lon": np.round(grid_lons, 6).tolist(),
+        "pm25": to_json_list(est_pm25),
+        "aqi": to_json_list(aqi_from_pm25(est_pm25), decimals=0)
+    }